@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+'''
+Compare the running time of TreeCluster.py on a small tree (which is mostly startup time) against a baseline version.
+
+The baseline is either a TreeCluster.py file or a git revision of this repository (e.g. a release tag). The baseline and the
+current version (the working tree of this repository) are copied to temporary directories and run alternately for a number
+of rounds, and the median wall-clock time of each command is reported:
+
+    * With cached bytecode (as after installing TreeCluster, or from the second run of a clone onward)
+    * Without cached bytecode (PYTHONDONTWRITEBYTECODE=1, with existing caches deleted)
+    * For many jobs: one run per job with the baseline vs. a single batch run (-b) with the current version
+'''
+from os import environ
+from os.path import abspath,dirname,isdir,isfile,join
+from shutil import copy,copytree,ignore_patterns,rmtree
+from statistics import median
+from subprocess import DEVNULL,PIPE,run
+from sys import executable
+from tempfile import mkdtemp
+from time import perf_counter
+REPO = dirname(dirname(abspath(__file__)))
+SMALL_TREE = '((A:0.1,B:0.2)1.0:0.1,(C:0.3,D:0.4)0.9:0.1);\n'
+
+# copy a version of TreeCluster.py (and its treecluster package, if it has one) into a new directory: a TreeCluster.py file, a git revision, or the working tree (None)
+def get_version(version, tmp):
+    out = mkdtemp(dir=tmp)
+    if version is None:
+        copy(join(REPO,'TreeCluster.py'), out)
+        if isdir(join(REPO,'treecluster')):
+            copytree(join(REPO,'treecluster'), join(out,'treecluster'), ignore=ignore_patterns('__pycache__'))
+    elif isfile(version):
+        copy(version, join(out,'TreeCluster.py'))
+    else:
+        from io import BytesIO
+        from tarfile import open as topen
+        p = run(['git', '-C', REPO, 'archive', '--format=tar', version], stdout=PIPE, stderr=PIPE)
+        assert p.returncode == 0, "ERROR: Invalid baseline (not a file or a git revision): %s" % version
+        with topen(fileobj=BytesIO(p.stdout)) as tar:
+            tar.extractall(out, members=[m for m in tar.getmembers() if m.name == 'TreeCluster.py' or m.name.startswith('treecluster/')])
+    return out
+
+# delete the cached bytecode of a version
+def clear_cache(path):
+    for d in [join(path,'__pycache__'), join(path,'treecluster','__pycache__')]:
+        if isdir(d):
+            rmtree(d)
+
+# run a command and return its wall-clock time (in seconds)
+def time_command(command, env):
+    start = perf_counter(); p = run(command, stdout=DEVNULL, stderr=PIPE, env=env); end = perf_counter()
+    assert p.returncode == 0, "ERROR: Command failed: %s\n%s" % (' '.join(command), p.stderr.decode())
+    return end-start
+
+if __name__ == "__main__":
+    # parse args
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-b', '--baseline', required=True, type=str, help="Baseline Version (TreeCluster.py file or git revision)")
+    parser.add_argument('-i', '--input', required=False, type=str, default=None, help="Input Tree File (default: a 4-leaf tree)")
+    parser.add_argument('-t', '--threshold', required=False, type=float, default=0.3, help="Length Threshold (default: 0.3)")
+    parser.add_argument('-m', '--methods', required=False, type=str, default='max_clade,single_linkage_union', help="Comma-Separated Clustering Methods (default: max_clade,single_linkage_union)")
+    parser.add_argument('-r', '--rounds', required=False, type=int, default=50, help="Number of Rounds (default: 50)")
+    parser.add_argument('-j', '--jobs', required=False, type=int, default=100, help="Number of Jobs in the Batch Comparison (0 to skip) (default: 100)")
+    args = parser.parse_args()
+    assert args.rounds > 0, "ERROR: Number of rounds must be positive"
+    assert args.jobs >= 0, "ERROR: Number of jobs must be at least 0"
+    methods = [m.strip() for m in args.methods.split(',') if len(m.strip()) != 0]
+    assert len(methods) != 0, "ERROR: No clustering methods given"
+
+    tmp = mkdtemp(prefix='treecluster_benchmark_')
+    try:
+        # set up the versions and the input tree
+        if args.input is None:
+            tree = join(tmp,'tree.nwk'); f = open(tree,'w'); f.write(SMALL_TREE); f.close()
+        else:
+            tree = abspath(args.input)
+        versions = [('baseline',get_version(args.baseline,tmp)), ('current',get_version(None,tmp))]
+        commands = [('%s %s' % (name,m), [executable, join(path,'TreeCluster.py'), '-i', tree, '-t', str(args.threshold), '-m', m, '-o', join(tmp,'out.txt')]) for name,path in versions for m in methods]
+        cached = {k:v for k,v in environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}; uncached = dict(cached); uncached['PYTHONDONTWRITEBYTECODE'] = '1'
+
+        # time the single runs (alternating between the commands, so they see the same machine load)
+        for mode,env in [('cached bytecode',cached), ('no cached bytecode',uncached)]:
+            for name,path in versions:
+                clear_cache(path)
+            if env is cached:
+                for name,command in commands: # write the bytecode cache
+                    time_command(command, env)
+            times = {name:list() for name,command in commands}
+            for r in range(args.rounds):
+                for name,command in commands:
+                    times[name].append(time_command(command, env))
+            print("Single runs (%s), median of %d rounds:" % (mode,args.rounds))
+            for m in methods:
+                base = median(times['baseline %s' % m]); curr = median(times['current %s' % m])
+                print("    %s: baseline %.1f ms, current %.1f ms (%.2fx)" % (m, base*1000, curr*1000, base/curr))
+
+        # time many jobs: one process per job (baseline) vs. a single batch run (current)
+        if args.jobs != 0:
+            manifest = join(tmp,'manifest.txt'); f = open(manifest,'w')
+            for i in range(args.jobs):
+                f.write('%s\t%s\t%s\t%s\n' % (tree, methods[i % len(methods)], args.threshold, join(tmp,'out%d.txt' % i)))
+            f.close()
+            base = sum(time_command(commands[i % len(methods)][1], cached) for i in range(args.jobs))
+            curr = median(time_command([executable, join(versions[1][1],'TreeCluster.py'), '-b', manifest], cached) for r in range(5))
+            print("%d jobs (cached bytecode): baseline %.1f ms (one run per job), current %.1f ms (one batch run) (%.2fx)" % (args.jobs, base*1000, curr*1000, base/curr))
+    finally:
+        rmtree(tmp)
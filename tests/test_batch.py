@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# check that batch manifests are read correctly and that batch mode (-b) gives the same output as one run per job
+from os.path import abspath,dirname,join
+from subprocess import PIPE,run
+import sys
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import pytest
+from treecluster.core import read_manifest
+REPO = dirname(dirname(abspath(__file__)))
+SCRIPT = join(REPO, 'TreeCluster.py')
+EXAMPLE = join(REPO, 'example', 'example_hiv.nwk')
+
+def write_manifest(tmp_path, text):
+    path = tmp_path / 'manifest.txt'; path.write_text(text)
+    return str(path)
+
+def test_read_manifest_fields(tmp_path):
+    path = write_manifest(tmp_path, 'in dir/a.nwk\tmax_clade\t0.1\tout dir/a.txt\n' # tab-separated fields can contain spaces
+                                    'b.nwk  Avg_Clade 0.2   b.txt 0.9\n'            # whitespace-separated, with support
+                                    'c.nwk\troot_dist\t3e-2\tc.txt\t0\n')
+    assert read_manifest(path) == [('in dir/a.nwk', 'out dir/a.txt', 'max_clade', 0.1, float('-inf')),
+                                   ('b.nwk', 'b.txt', 'Avg_Clade', 0.2, 0.9),
+                                   ('c.nwk', 'c.txt', 'root_dist', 0.03, 0.)]
+
+def test_read_manifest_default_support(tmp_path):
+    path = write_manifest(tmp_path, 'a.nwk max_clade 0.1 a.txt\nb.nwk max_clade 0.1 b.txt 0.5\n')
+    assert [job[4] for job in read_manifest(path, 0.7)] == [0.7, 0.5]
+
+def test_read_manifest_comments(tmp_path):
+    path = write_manifest(tmp_path, '# input method threshold output\n\n   \n  # indented comment\na.nwk max_clade 0.1 a.txt\r\n\n')
+    assert read_manifest(path) == [('a.nwk', 'a.txt', 'max_clade', 0.1, float('-inf'))]
+
+@pytest.mark.parametrize('line,message', [
+    ('a.nwk max_clade 0.1', 'line 2'),             # too few fields
+    ('a.nwk max_clade 0.1 a.txt 0.5 x', 'line 2'), # too many fields
+    ('a.nwk max_clade x a.txt', 'line 2'),         # invalid threshold
+    ('a.nwk max_clade 0.1 a.txt x', 'line 2'),     # invalid support
+])
+def test_read_manifest_errors(tmp_path, line, message):
+    path = write_manifest(tmp_path, '# comment\n%s\n' % line)
+    with pytest.raises(AssertionError, match=message):
+        read_manifest(path)
+
+def cluster(*args):
+    return run([sys.executable, SCRIPT] + list(args), stdout=PIPE, stderr=PIPE)
+
+def test_batch_matches_single_runs(tmp_path):
+    jobs = [('max_clade',0.045,None), ('avg_clade',0.01,'0.9'), ('root_dist',0.02,None), ('max',0.045,'0.5')]
+    lines = ['# batch test', '']
+    for i,(method,threshold,support) in enumerate(jobs):
+        lines.append('\t'.join([EXAMPLE, method, str(threshold), str(tmp_path / ('batch%d.txt' % i))] + ([] if support is None else [support])))
+    p = cluster('-b', write_manifest(tmp_path, '\n'.join(lines) + '\n'), '-s', '0.2')
+    assert p.returncode == 0, p.stderr.decode()
+    for i,(method,threshold,support) in enumerate(jobs):
+        single = str(tmp_path / ('single%d.txt' % i))
+        p = cluster('-i', EXAMPLE, '-m', method, '-t', str(threshold), '-s', '0.2' if support is None else support, '-o', single)
+        assert p.returncode == 0, p.stderr.decode()
+        assert open(single).read() == open(str(tmp_path / ('batch%d.txt' % i))).read()
+
+def test_batch_out_of_core(tmp_path):
+    path = write_manifest(tmp_path, '%s\tmax_clade\t0.045\t%s\n' % (EXAMPLE, tmp_path / 'batch.txt'))
+    assert cluster('-b', path, '--out_of_core').returncode == 0
+    assert cluster('-i', EXAMPLE, '-t', '0.045', '--out_of_core', '-o', str(tmp_path / 'single.txt')).returncode == 0
+    assert open(str(tmp_path / 'single.txt')).read() == open(str(tmp_path / 'batch.txt')).read()
+
+@pytest.mark.parametrize('job,message', [
+    ('%s\tnope\t0.1\t{out}' % EXAMPLE, 'Invalid method'),
+    ('{tmp}/missing.nwk\tmax_clade\t0.1\t{out}', 'Input file not found'),
+    ('%s\tmax_clade\t0.1\t{tmp}/missing/out.txt' % EXAMPLE, 'Output directory not found'),
+    ('%s\tmax_clade\t0.1\t{tmp}' % EXAMPLE, 'Output file is a directory'),
+    ('%s\tmed_clade\t0.1\t{out}' % EXAMPLE, 'not supported in out-of-core mode'),
+])
+def test_batch_checks_all_jobs_first(tmp_path, job, message):
+    first = tmp_path / 'first.txt'; first.write_text('old\n')
+    path = write_manifest(tmp_path, '%s\tmax_clade\t0.045\t%s\n%s\n' % (EXAMPLE, first, job.format(tmp=tmp_path, out=tmp_path / 'second.txt')))
+    p = cluster('-b', path, '--out_of_core')
+    assert p.returncode != 0 and message in p.stderr.decode()
+    assert first.read_text() == 'old\n' # the first job wasn't run
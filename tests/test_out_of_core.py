@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# check that out-of-core mode (treecluster.out_of_core) finds the same clusters as the in-memory methods (treecluster.core)
+from os import listdir
+from os.path import abspath,dirname,join
+import sys
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import pytest
+from treeswift import read_tree_newick
+from treecluster.core import METHODS,OUT_OF_CORE_METHODS,cluster_file
+from treecluster.out_of_core import OUT_OF_CORE,DiskStack,stream_trees
+EXAMPLE = join(dirname(dirname(abspath(__file__))), 'example', 'example_hiv.nwk')
+
+# polytomies, unifurcations, missing edge lengths, support values, quoted labels, and comments, in two trees
+TRICKY = '''(((a:0.01,b:0.02,c:0.03,d:0.01)0.9:0.02,((e:0.01)0.2:0.01,f)0.95:0.01)0.3:0.05,'g h':0.04[&c=1],((i:0.02,j:0.02)0.99:0.01)1.0:0.02)0.5;
+((k:0.1,l:0.01,m:0.02)0.7:0.03,(n:0.02,(o:0.01,p:0.01):0.01)0.4:0.02,q:0.05);
+'''
+
+# clusters as a set of sets of leaf labels
+def partition(clusters):
+    return {frozenset(cluster) for cluster in clusters}
+
+def in_memory(newicks, method, threshold, support):
+    return [partition(METHODS[method](read_tree_newick(newick), threshold, support)) for newick in newicks]
+
+def out_of_core(path, method, threshold, support, tmp_dir, chunk_size):
+    out = list()
+    for tree in stream_trees(path, method, support, tmp_dir, chunk_size=chunk_size):
+        out.append(partition(OUT_OF_CORE[method][4](tree, threshold))); tree.close()
+    return out
+
+def test_methods_match():
+    assert set(OUT_OF_CORE.keys()) == OUT_OF_CORE_METHODS
+
+@pytest.mark.parametrize('method', sorted(OUT_OF_CORE_METHODS))
+def test_example(method, tmp_path):
+    newick = open(EXAMPLE).read().strip()
+    for threshold,support in [(0.045,float('-inf')), (0.045,0.9), (0.01,0.5)]:
+        assert out_of_core(EXAMPLE, method, threshold, support, str(tmp_path), 1048576) == in_memory([newick], method, threshold, support)
+    assert listdir(str(tmp_path)) == []
+
+@pytest.mark.parametrize('method', sorted(OUT_OF_CORE_METHODS))
+def test_tricky(method, tmp_path):
+    path = tmp_path / 'tricky.nwk'; path.write_text(TRICKY); spill = tmp_path / 'spill'; spill.mkdir()
+    newicks = TRICKY.strip().splitlines()
+    for threshold in [0, 0.02, 0.05, 0.1, 1]:
+        for support in [float('-inf'), 0.5, 0.96]:
+            for chunk_size in [1, 7, 1048576]: # tokens split across chunks
+                assert out_of_core(str(path), method, threshold, support, str(spill), chunk_size) == in_memory(newicks, method, threshold, support)
+    assert listdir(str(spill)) == []
+
+def test_wide_polytomies(tmp_path):
+    star = '(%s)' % ','.join('s%d:%.2f' % (i,(i*7 % 10)/100.) for i in range(300))
+    newick = '((:0.01)u:0.02,%s0.9:0.01,(%s):0.5);\n' % (star, ','.join('p%d:0.01' % i for i in range(100)))
+    path = tmp_path / 'wide.nwk'; path.write_text(newick); spill = tmp_path / 'spill'; spill.mkdir()
+    for method in sorted(OUT_OF_CORE_METHODS):
+        for threshold,support in [(0.05,float('-inf')), (0.15,0.95), (1,float('-inf'))]:
+            assert out_of_core(str(path), method, threshold, support, str(spill), 1048576) == in_memory([newick], method, threshold, support)
+    assert listdir(str(spill)) == []
+
+def test_disk_stack(tmp_path):
+    stack = DiskStack(2, str(tmp_path), buffer_size=3); records = list()
+    for i in range(50):
+        for j in range(i % 7):
+            records.append((i, j, (i/2., float(j)))); stack.push(*records[-1])
+        for j in range(i % 5):
+            if len(records) != 0:
+                assert stack.pop() == records.pop()
+        assert len(stack) == len(records)
+    while len(records) != 0:
+        assert stack.pop() == records.pop()
+    stack.close()
+    assert listdir(str(tmp_path)) == []
+
+def test_multiline_labels(tmp_path):
+    newick = "('a\nb':0.01,'c\n':0.02,('\nd':0.01,e:0.01)0.9:0.01);\n"
+    path = tmp_path / 'labels.nwk'; path.write_text(newick); spill = tmp_path / 'spill'; spill.mkdir()
+    for method in sorted(OUT_OF_CORE_METHODS):
+        clusters = out_of_core(str(path), method, 0.05, float('-inf'), str(spill), 3)
+        assert clusters == in_memory([newick], method, 0.05, float('-inf'))
+        assert set().union(*clusters[0]) == {'ab','c','d','e'}
+
+def test_invalid_newick_cleanup(tmp_path):
+    path = tmp_path / 'invalid.nwk'; path.write_text('(a:1,b:1);\n((a,b);\n'); spill = tmp_path / 'spill'; spill.mkdir()
+    with pytest.raises(AssertionError):
+        out_of_core(str(path), 'max_clade', 1, float('-inf'), str(spill), 1048576)
+    assert listdir(str(spill)) == []
+
+def test_unwritable_output_cleanup(tmp_path):
+    spill = tmp_path / 'spill'; spill.mkdir()
+    with pytest.raises(OSError):
+        cluster_file(EXAMPLE, str(tmp_path / 'missing' / 'out.txt'), 'max_clade', 0.045, out_of_core=True, tmp_dir=str(spill))
+    assert listdir(str(spill)) == []
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# check that server mode (treecluster.server) answers queries like the command line and reuses its prepared trees
+from io import StringIO
+from os.path import abspath,dirname,join
+from threading import Thread
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import sys
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import pytest
+from treeswift import read_tree_newick
+from treecluster.core import METHODS,write_clusters
+from treecluster.server import PreparedTreeCache,make_server
+EXAMPLE = join(dirname(dirname(abspath(__file__))), 'example', 'example_hiv.nwk')
+
+# polytomies, unifurcations, missing edge lengths, and support values
+SMALL = '(((a:0.01,b:0.02,c:0.03,d:0.01)0.9:0.02,((e:0.01)0.2:0.01,f)0.95:0.01)0.3:0.05,g:0.04,((i:0.02,j:0.02)0.99:0.01,(k:0.1,l:0.01,m:0.02)0.7:0.03)1.0:0.02);'
+
+# clusters (in the output format) as a set of sets of leaf labels
+def partition(text):
+    clusters = dict(); out = set()
+    for line in text.splitlines()[1:]:
+        label,num = line.split('\t')
+        if num == '-1':
+            out.add(frozenset([label]))
+        else:
+            clusters.setdefault(num, set()).add(label)
+    return out | {frozenset(cluster) for cluster in clusters.values()}
+
+# start a server on a free port, and count how many times it prepares a tree
+@pytest.fixture
+def start_server():
+    servers = list()
+    def start(paths, max_bytes=float('inf')):
+        server = make_server(paths, '127.0.0.1', 0, max_bytes); builds = list(); build = server.cache.build
+        def counting_build(name, method, support):
+            builds.append((name,method,support)); return build(name, method, support)
+        server.cache.build = counting_build; server.builds = builds
+        Thread(target=server.serve_forever, kwargs={'poll_interval':0.01}, daemon=True).start(); servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown(); server.server_close()
+
+def get(server, query):
+    try:
+        with urlopen('http://127.0.0.1:%d%s' % (server.server_port,query)) as response:
+            return response.status, response.read().decode()
+    except HTTPError as e:
+        return e.code, e.read().decode()
+
+def test_trees(start_server):
+    server = start_server({'hiv':EXAMPLE, 'other':EXAMPLE})
+    assert get(server, '/trees') == (200, 'hiv\nother\n')
+
+@pytest.mark.parametrize('method', sorted(METHODS.keys()))
+def test_cluster_matches_methods(start_server, method, tmp_path):
+    path = tmp_path / 'small.nwk'; path.write_text(SMALL)
+    server = start_server({'small':str(path)})
+    for threshold,support in [(0.02,float('-inf')), (0.05,0.5), (0.1,0.95), (0.045,0.9)]:
+        code,text = get(server, '/cluster?tree=small&method=%s&threshold=%s&support=%s' % (method,threshold,support))
+        try:
+            out = StringIO(); write_clusters(METHODS[method](read_tree_newick(SMALL), threshold, support), out)
+        except Exception: # the server reports a failing method
+            assert code == 500; continue
+        assert code == 200 and partition(text) == partition(out.getvalue())
+
+def test_errors(start_server, tmp_path):
+    multi = tmp_path / 'multi.nwk'; multi.write_text('(a:1,b:1);\n(c:1,d:1);\n')
+    server = start_server({'hiv':EXAMPLE, 'multi':str(multi)})
+    for query in ['/cluster?tree=hiv', '/cluster?threshold=1', '/cluster?tree=hiv&threshold=x', '/cluster?tree=hiv&threshold=-1', '/cluster?tree=hiv&threshold=nan',
+                  '/cluster?tree=hiv&threshold=1&support=-1', '/cluster?tree=hiv&threshold=1&support=nan', '/cluster?tree=hiv&threshold=1&method=nope']:
+        assert get(server, query)[0] == 400, query
+    assert get(server, '/nope')[0] == 404
+    assert get(server, '/cluster?tree=nope&threshold=1')[0] == 404
+    code,text = get(server, '/cluster?tree=multi&threshold=1')
+    assert code == 500 and text.startswith('ERROR: AssertionError')
+    assert get(server, '/cluster?tree=hiv&threshold=0.045')[0] == 200 # the server still answers after an error
+
+def test_reuse(start_server):
+    server = start_server({'hiv':EXAMPLE})
+    for threshold in [0.01, 0.045, 0.1, 0.045]:
+        assert get(server, '/cluster?tree=hiv&method=max_clade&threshold=%s' % threshold)[0] == 200
+    assert server.builds == [('hiv','max_clade',float('-inf'))]
+    for method in ['max', 'root_dist', 'single_linkage_cut']: # the non-clade methods share one prepared tree, for any support
+        for support in [float('-inf'), 0.9]:
+            assert get(server, '/cluster?tree=hiv&method=%s&threshold=0.045&support=%s' % (method,support))[0] == 200
+    assert len(server.builds) == 2 and len(server.cache.entries) == 2
+
+def test_eviction(start_server):
+    entry_bytes = PreparedTreeCache({'hiv':EXAMPLE}, float('inf')).build('hiv', 'max_clade', float('-inf'))['bytes']
+    server = start_server({'hiv':EXAMPLE}, max_bytes=2.5*entry_bytes) # room for two prepared trees
+    for support in [0.1, 0.2, 0.1, 0.3]: # 0.2 is the least recently used when 0.3 is added
+        assert get(server, '/cluster?tree=hiv&method=max_clade&threshold=0.045&support=%s' % support)[0] == 200
+    assert list(server.cache.entries.keys()) == [('hiv','max_clade',0.1), ('hiv','max_clade',0.3)]
+    assert server.cache.num_bytes <= 2.5*entry_bytes
+    assert get(server, '/cluster?tree=hiv&method=max_clade&threshold=0.045&support=0.2')[0] == 200
+    assert [b[2] for b in server.builds] == [0.1, 0.2, 0.3, 0.2] # the evicted tree is prepared again
@@ -0,0 +1 @@
+# TreeCluster: core clustering methods (core), server mode (server), and out-of-core mode (out_of_core)
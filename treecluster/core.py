@@ -0,0 +1,623 @@
+from collections import deque
+from heapq import heappop,heappush
+from math import log
+from sys import stderr
+NUM_THRESH = 1000 # number of thresholds for the threshold-free methods to use
+VERBOSE = False
+
+# merge two sorted lists into a sorted list
+def merge_two_sorted_lists(x,y):
+    out = list(); i = 0; j = 0
+    while i < len(x) and j < len(y):
+        if x[i] < y[j]:
+            out.append(x[i]); i+= 1
+        else:
+            out.append(y[j]); j += 1
+    while i < len(x):
+        out.append(x[i]); i += 1
+    while j < len(y):
+        out.append(y[j]); j += 1
+    return out
+
+# merge multiple sorted lists into a sorted list
+def merge_multi_sorted_lists(lists):
+    pq = list()
+    for l in range(len(lists)):
+        if len(lists[l]) != 0:
+            heappush(pq, (lists[l][0],l))
+    inds = [1 for _ in range(len(lists))]
+    out = list()
+    while len(pq) != 0:
+        d,l = heappop(pq); out.append(d)
+        if inds[l] < len(lists[l]):
+            heappush(pq, (lists[l][inds[l]],l))
+        inds[l] += 1
+    return out
+
+# get the median of a sorted list
+def median(x):
+    if len(x) % 2 != 0:
+        return x[int(len(x)/2)]
+    else:
+        return (x[int(len(x)/2)]+x[int(len(x)/2)-1])/2
+
+# get the average of a list
+def avg(x):
+    return float(sum(x))/len(x)
+
+# convert p-distance to Jukes-Cantor distance
+def p_to_jc(d,seq_type):
+    b = {'dna':3./4., 'protein':19./20.}[seq_type]
+    return -1*b*log(1-(d/b))
+
+# cut out the current node's subtree (by setting all nodes' DELETED to True) and return list of leaves
+def cut(node):
+    cluster = list()
+    descendants = deque(); descendants.append(node)
+    while len(descendants) != 0:
+        descendant = descendants.popleft()
+        if descendant.DELETED:
+            continue
+        descendant.DELETED = True
+        descendant.left_dist = 0; descendant.right_dist = 0; descendant.edge_length = 0
+        if descendant.is_leaf():
+            cluster.append(str(descendant))
+        else:
+            for c in descendant.children:
+                descendants.append(c)
+    return cluster
+
+# initialize properties of input tree and return set containing taxa of leaves
+def prep(tree, support, resolve_polytomies=True, suppress_unifurcations=True):
+    if resolve_polytomies:
+        tree.resolve_polytomies()
+    if suppress_unifurcations:
+        tree.suppress_unifurcations()
+    leaves = set()
+    for node in tree.traverse_postorder():
+        if node.edge_length is None:
+            node.edge_length = 0
+        node.DELETED = False
+        if node.is_leaf():
+            leaves.add(str(node))
+        else:
+            try:
+                node.confidence = float(str(node))
+            except:
+                node.confidence = 100. # give edges without support values support 100
+            if node.confidence < support: # don't allow low-support edges
+                node.edge_length = float('inf')
+    return leaves
+
+# find the highest clades whose statistic (node attribute "key") is at most threshold, and return their leaves as clusters
+def clade_clusters(tree,threshold,key):
+    q = deque(); q.append(tree.root); roots = list()
+    while len(q) != 0:
+        node = q.popleft()
+        if getattr(node,key) <= threshold:
+            roots.append(node)
+        else:
+            q.extend(node.children)
+
+    # if verbose, print the clades defined by each cluster
+    if VERBOSE:
+        for root in roots:
+            print("%s;" % root.newick(), file=stderr)
+    return [[str(l) for l in root.traverse_leaves()] for root in roots]
+
+# return a sorted list of all unique pairwise leaf distances <= a given threshold
+def pairwise_dists_below_thresh(tree,threshold):
+    pairwise_dists = set()
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.leaf_dists = {0}; node.min_leaf_dist = 0
+        else:
+            children = list(node.children)
+            for i in range(len(children)-1):
+                c1 = children[i]
+                for j in range(i+1,len(children)):
+                    c2 = children[j]
+                    for d1 in c1.leaf_dists:
+                        for d2 in c2.leaf_dists:
+                            pd = d1 + c1.edge_length + d2 + c2.edge_length
+                            if pd <= threshold:
+                                pairwise_dists.add(pd)
+            node.leaf_dists = set(); node.min_leaf_dist = float('inf')
+            for c in children:
+                if c.min_leaf_dist + c.edge_length > threshold:
+                    continue
+                for d in c.leaf_dists:
+                    nd = d+c.edge_length
+                    if nd < threshold:
+                        node.leaf_dists.add(nd)
+                    if nd < node.min_leaf_dist:
+                        node.min_leaf_dist = nd
+    return sorted(pairwise_dists)
+
+# split leaves into minimum number of clusters such that the maximum leaf pairwise distance is below some threshold
+def min_clusters_threshold_max(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+    for node in tree.traverse_postorder():
+        # if I've already been handled, ignore me
+        if node.DELETED:
+            continue
+
+        # find my undeleted max distances to leaf
+        if node.is_leaf():
+            node.left_dist = 0; node.right_dist = 0
+        else:
+            children = list(node.children)
+            if children[0].DELETED and children[1].DELETED:
+                cut(node); continue
+            if children[0].DELETED:
+                node.left_dist = 0
+            else:
+                node.left_dist = max(children[0].left_dist,children[0].right_dist) + children[0].edge_length
+            if children[1].DELETED:
+                node.right_dist = 0
+            else:
+                node.right_dist = max(children[1].left_dist,children[1].right_dist) + children[1].edge_length
+
+            # if my kids are screwing things up, cut out the longer one
+            if node.left_dist + node.right_dist > threshold:
+                if node.left_dist > node.right_dist:
+                    cluster = cut(children[0])
+                    node.left_dist = 0
+                else:
+                    cluster = cut(children[1])
+                    node.right_dist = 0
+
+                # add cluster
+                if len(cluster) != 0:
+                    clusters.append(cluster)
+                    for leaf in cluster:
+                        leaves.remove(leaf)
+
+    # add all remaining leaves to a single cluster
+    if len(leaves) != 0:
+        clusters.append(list(leaves))
+    return clusters
+
+# bottom-up traversal to compute median pairwise distances (stored as node.med_pair_dist)
+def med_clade_stats(tree):
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.med_pair_dist = 0
+            node.leaf_dists = [0]
+            node.pair_dists = list()
+        else:
+            children = list(node.children)
+            l_leaf_dists = [d + children[0].edge_length for d in children[0].leaf_dists]
+            r_leaf_dists = [d + children[1].edge_length for d in children[1].leaf_dists]
+            node.leaf_dists = merge_two_sorted_lists(l_leaf_dists,r_leaf_dists)
+            if len(l_leaf_dists) < len(r_leaf_dists):
+                across_leaf_dists = [[l+r for r in r_leaf_dists] for l in l_leaf_dists]
+            else:
+                across_leaf_dists = [[l+r for l in l_leaf_dists] for r in r_leaf_dists]
+            node.pair_dists = merge_multi_sorted_lists([children[0].pair_dists,children[1].pair_dists] + across_leaf_dists)
+            if node.pair_dists[-1] == float('inf'):
+                node.med_pair_dist = float('inf')
+            else:
+                node.med_pair_dist = median(node.pair_dists)
+            for c in (children[0],children[1]):
+                del c.leaf_dists; del c.pair_dists
+    del tree.root.leaf_dists; del tree.root.pair_dists
+
+# median leaf pairwise distance cannot exceed threshold, and clusters must define clades
+def min_clusters_threshold_med_clade(tree,threshold,support):
+    leaves = prep(tree,support)
+    med_clade_stats(tree)
+    return clade_clusters(tree,threshold,'med_pair_dist')
+
+# bottom-up traversal to compute average pairwise distances (stored as node.avg_pair_dist)
+def avg_clade_stats(tree):
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.num_leaves = 1
+            node.total_pair_dist = 0
+            node.total_leaf_dist = 0
+            node.avg_pair_dist = 0
+        else:
+            x, y = node.children # polytomies have been resolved in `prep()`
+            node.num_leaves = x.num_leaves + y.num_leaves
+            total_leaf_dist_thru_x = x.total_leaf_dist + (x.num_leaves * x.edge_length)
+            total_leaf_dist_thru_y = y.total_leaf_dist + (y.num_leaves * y.edge_length)
+            node.total_pair_dist = (x.total_pair_dist + y.total_pair_dist) + (total_leaf_dist_thru_x*y.num_leaves + total_leaf_dist_thru_y*x.num_leaves)
+            node.total_leaf_dist = total_leaf_dist_thru_x + total_leaf_dist_thru_y
+            node.avg_pair_dist = node.total_pair_dist/((node.num_leaves*(node.num_leaves-1))/2)
+
+# average leaf pairwise distance cannot exceed threshold, and clusters must define clades
+def min_clusters_threshold_avg_clade(tree,threshold,support):
+    leaves = prep(tree,support)
+    avg_clade_stats(tree)
+    return clade_clusters(tree,threshold,'avg_pair_dist')
+
+# compute branch length sums of clades (stored as node.total_bl)
+def sum_bl_clade_stats(tree):
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.total_bl = 0
+        else:
+            node.total_bl = sum(c.total_bl + c.edge_length for c in node.children)
+
+# total branch length cannot exceed threshold, and clusters must define clades
+def min_clusters_threshold_sum_bl_clade(tree,threshold,support):
+    leaves = prep(tree,support)
+    sum_bl_clade_stats(tree)
+    return clade_clusters(tree,threshold,'total_bl')
+
+# total branch length cannot exceed threshold
+def min_clusters_threshold_sum_bl(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.left_total = 0; node.right_total = 0
+        else:
+            children = list(node.children)
+            if children[0].DELETED and children[1].DELETED:
+                cut(node); continue
+            if children[0].DELETED:
+                node.left_total = 0
+            else:
+                node.left_total = children[0].left_total + children[0].right_total + children[0].edge_length
+            if children[1].DELETED:
+                node.right_total = 0
+            else:
+                node.right_total = children[1].left_total + children[1].right_total + children[1].edge_length
+            if node.left_total + node.right_total > threshold:
+                if node.left_total > node.right_total:
+                    cluster = cut(children[0])
+                    node.left_total = 0
+                else:
+                    cluster = cut(children[1])
+                    node.right_total = 0
+                if len(cluster) != 0:
+                    clusters.append(cluster)
+                    for leaf in cluster:
+                        leaves.remove(leaf)
+    if len(leaves) != 0:
+        clusters.append(list(leaves))
+    return clusters
+
+# single-linkage clustering using Metin's cut algorithm
+def single_linkage_cut(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+
+	# find closest leaf below (dist,leaf)
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.min_below = (0,node.label)
+        else:
+            node.min_below = min((c.min_below[0]+c.edge_length,c.min_below[1]) for c in node.children)
+
+    # find closest leaf above (dist,leaf)
+    for node in tree.traverse_preorder():
+        node.min_above = (float('inf'),None)
+        if node.is_root():
+            continue
+        # min distance through sibling
+        for c in node.parent.children:
+            if c != node:
+                dist = node.edge_length + c.edge_length + c.min_below[0]
+                if dist < node.min_above[0]:
+                    node.min_above = (dist,c.min_below[1])
+        # min distance through grandparent
+        if not c.parent.is_root():
+            dist = node.edge_length + node.parent.min_above[0]
+            if dist < node.min_above[0]:
+                node.min_above = (dist,node.parent.min_above[1])
+
+    # find clusters
+    for node in tree.traverse_postorder(leaves=False):
+        # assume binary tree here (prep function guarantees this)
+        l_child,r_child = node.children
+        l_dist = l_child.min_below[0] + l_child.edge_length
+        r_dist = r_child.min_below[0] + r_child.edge_length
+        a_dist = node.min_above[0]
+        bad = [0,0,0] # left, right, up
+        if l_dist + r_dist > threshold:
+            bad[0] += 1; bad[1] += 1
+        if l_dist + a_dist > threshold:
+            bad[0] += 1; bad[2] += 1
+        if r_dist + a_dist > threshold:
+            bad[1] += 1; bad[2] += 1
+        # cut either (or both) children
+        for i in [0,1]:
+            if bad[i] == 2:
+                cluster = cut(node.children[i])
+                if len(cluster) != 0:
+                    clusters.append(cluster)
+                    for leaf in cluster:
+                        leaves.remove(leaf)
+        # cut above (equals cutting me)
+        if bad[2] == 2: # if cutting above, just cut me
+            cluster = cut(node)
+            if len(cluster) != 0:
+                clusters.append(cluster)
+                for leaf in cluster:
+                    leaves.remove(leaf)
+    if len(leaves) != 0:
+        clusters.append(list(leaves))
+    return clusters
+
+# single-linkage clustering using Niema's union algorithm
+def single_linkage_union(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+
+    # find closest leaf below (dist,leaf)
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.min_below = (0,node.label)
+        else:
+            node.min_below = min((c.min_below[0]+c.edge_length,c.min_below[1]) for c in node.children)
+
+    # find closest leaf above (dist,leaf)
+    for node in tree.traverse_preorder():
+        node.min_above = (float('inf'),None)
+        if node.is_root():
+            continue
+        # min distance through sibling
+        for c in node.parent.children:
+            if c != node:
+                dist = node.edge_length + c.edge_length + c.min_below[0]
+                if dist < node.min_above[0]:
+                    node.min_above = (dist,c.min_below[1])
+        # min distance through grandparent
+        if not c.parent.is_root():
+            dist = node.edge_length + node.parent.min_above[0]
+            if dist < node.min_above[0]:
+                node.min_above = (dist,node.parent.min_above[1])
+
+    # set up Disjoint Set
+    from niemads import DisjointSet
+    ds = DisjointSet(leaves)
+    for node in tree.traverse_preorder(leaves=False):
+        # children to min above
+        for c in node.children:
+            if c.min_below[0] + c.edge_length + node.min_above[0] <= threshold:
+                ds.union(c.min_below[1], node.min_above[1])
+        for i in range(len(node.children)-1):
+            c1 = node.children[i]
+            for j in range(i+1, len(node.children)):
+                c2 = node.children[j]
+                if c1.min_below[0] + c1.edge_length + c2.min_below[0] + c2.edge_length <= threshold:
+                    ds.union(c1.min_below[1], c2.min_below[1])
+    return [list(s) for s in ds.sets()]
+
+# compute leaf distances and max pairwise distances of clades (stored as node.max_pair_dist)
+def max_clade_stats(tree):
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.leaf_dist = 0; node.max_pair_dist = 0
+        else:
+            node.leaf_dist = float('-inf'); second_max_leaf_dist = float('-inf')
+            for c in node.children: # at least 2 children because of suppressing unifurcations
+                curr_dist = c.leaf_dist + c.edge_length
+                if curr_dist > node.leaf_dist:
+                    second_max_leaf_dist = node.leaf_dist; node.leaf_dist = curr_dist
+                elif curr_dist > second_max_leaf_dist:
+                    second_max_leaf_dist = curr_dist
+            node.max_pair_dist = max([c.max_pair_dist for c in node.children] + [node.leaf_dist + second_max_leaf_dist])
+
+# min_clusters_threshold_max, but all clusters must define a clade
+def min_clusters_threshold_max_clade(tree,threshold,support):
+    leaves = prep(tree, support, resolve_polytomies=False)
+    max_clade_stats(tree)
+    return clade_clusters(tree,threshold,'max_pair_dist')
+
+# pick the threshold between 0 and "threshold" that maximizes number of (non-singleton) clusters
+def argmax_clusters(method,tree,threshold,support):
+    from copy import deepcopy
+    assert threshold > 0, "Threshold must be positive"
+    #thresholds = pairwise_dists_below_thresh(deepcopy(tree),threshold)
+    thresholds = [i*threshold/NUM_THRESH for i in range(NUM_THRESH+1)]
+    best = None; best_num = -1; best_t = -1
+    for i,t in enumerate(thresholds):
+        if VERBOSE:
+            print("%s%%"%str(i*100/len(thresholds)).rstrip('0'),end='\r',file=stderr)
+        clusters = method(deepcopy(tree),t,support)
+        num_non_singleton = len([c for c in clusters if len(c) > 1])
+        if num_non_singleton > best_num:
+            best = clusters; best_num = num_non_singleton; best_t = t
+    print("\nBest Threshold: %f"%best_t,file=stderr)
+    return best
+
+# cut all branches longer than the threshold
+def length(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+    for node in tree.traverse_postorder():
+        # if I've already been handled, ignore me
+        if node.DELETED:
+            continue
+
+        # if i'm screwing things up, cut me
+        if node.edge_length is not None and node.edge_length > threshold:
+            cluster = cut(node)
+            if len(cluster) != 0:
+                clusters.append(cluster)
+                for leaf in cluster:
+                    leaves.remove(leaf)
+
+    # add all remaining leaves to a single cluster
+    if len(leaves) != 0:
+        clusters.append(list(leaves))
+    return clusters
+
+# compute max branch length in clades (stored as node.max_bl)
+def length_clade_stats(tree):
+    for node in tree.traverse_postorder():
+        if node.is_leaf():
+            node.max_bl = 0
+        else:
+            node.max_bl = max([c.max_bl for c in node.children] + [c.edge_length for c in node.children])
+
+# same as length, and clusters must define a clade
+def length_clade(tree,threshold,support):
+    leaves = prep(tree,support)
+    length_clade_stats(tree)
+    return clade_clusters(tree,threshold,'max_bl')
+
+# cut tree at threshold distance from root (clusters will be clades by definition) (ignores support threshold if branch is below cutting point)
+def root_dist(tree,threshold,support):
+    leaves = prep(tree,support)
+    clusters = list()
+    for node in tree.traverse_preorder():
+        # if I've already been handled, ignore me
+        if node.DELETED:
+            continue
+        if node.is_root():
+            node.root_dist = 0
+        else:
+            node.root_dist = node.parent.root_dist + node.edge_length
+        if node.root_dist > threshold:
+            cluster = cut(node)
+            if len(cluster) != 0:
+                clusters.append(cluster)
+                for leaf in cluster:
+                    leaves.remove(leaf)
+
+    # add all remaining leaves to a single cluster
+    if len(leaves) != 0:
+        clusters.append(list(leaves))
+    return clusters
+
+# cut tree at threshold distance from the leaves (if tree not ultrametric, max = distance from furthest leaf from root, min = distance from closest leaf to root, avg = average of all leaves)
+def leaf_dist(tree,threshold,support,mode):
+    modes = {'max':max,'min':min,'avg':avg}
+    assert mode in modes, "Invalid mode. Must be one of: %s" % ', '.join(sorted(modes.keys()))
+    dist_from_root = modes[mode](d for u,d in tree.distances_from_root(internal=False)) - threshold
+    return root_dist(tree,dist_from_root,support)
+def leaf_dist_max(tree,threshold,support):
+    return leaf_dist(tree,threshold,support,'max')
+def leaf_dist_min(tree,threshold,support):
+    return leaf_dist(tree,threshold,support,'min')
+def leaf_dist_avg(tree,threshold,support):
+    return leaf_dist(tree,threshold,support,'avg')
+
+METHODS = {
+    'max': min_clusters_threshold_max,
+    'max_clade': min_clusters_threshold_max_clade,
+    'sum_branch': min_clusters_threshold_sum_bl,
+    'sum_branch_clade': min_clusters_threshold_sum_bl_clade,
+    'avg_clade': min_clusters_threshold_avg_clade,
+    'med_clade': min_clusters_threshold_med_clade,
+    'single_linkage': single_linkage_cut,
+    'single_linkage_cut': single_linkage_cut,
+    'single_linkage_union': single_linkage_union,
+    'length': length,
+    'length_clade': length_clade,
+    'root_dist': root_dist,
+    'leaf_dist_max': leaf_dist_max,
+    'leaf_dist_min': leaf_dist_min,
+    'leaf_dist_avg': leaf_dist_avg
+}
+THRESHOLDFREE = {'argmax_clusters':argmax_clusters}
+OUT_OF_CORE_METHODS = {'avg_clade', 'length_clade', 'max_clade', 'root_dist', 'sum_branch_clade'} # see treecluster.out_of_core
+
+# open a (possibly gzipped) text file for reading, or stdin
+def open_input(path):
+    if path == 'stdin':
+        from sys import stdin; return stdin
+    elif path.lower().endswith('.gz'):
+        from gzip import open as gopen; return gopen(path, 'rt')
+    else:
+        return open(path)
+
+# open a text file for writing, or stdout
+def open_output(path):
+    if path == 'stdout':
+        from sys import stdout; return stdout
+    else:
+        return open(path,'w')
+
+# read the Newick string(s) in a file (or stdin)
+def read_newick(path):
+    infile = open_input(path); newick = infile.read().strip()
+    if path != 'stdin':
+        infile.close()
+    return newick
+
+# write clusters in the Cluster Picker format (leaves in singleton clusters get cluster number -1)
+def write_clusters(clusters,outfile):
+    outfile.write('SequenceName\tClusterNumber\n')
+    cluster_num = 1
+    for cluster in clusters:
+        if len(cluster) == 1:
+            outfile.write('%s\t-1\n' % list(cluster)[0])
+        else:
+            for l in cluster:
+                outfile.write('%s\t%d\n' % (l,cluster_num))
+            cluster_num += 1
+
+# check the parameters of a clustering job
+def check_job(method, threshold, support, threshold_free, out_of_core):
+    assert method.lower() in METHODS, "ERROR: Invalid method: %s" % method
+    assert threshold_free is None or threshold_free in THRESHOLDFREE, "ERROR: Invalid threshold-free approach: %s" % threshold_free
+    assert threshold >= 0, "ERROR: Length threshold must be at least 0"
+    assert support >= 0 or support == float('-inf'), "ERROR: Branch support must be at least 0"
+    assert not out_of_core or method.lower() in OUT_OF_CORE_METHODS, "ERROR: Method not supported in out-of-core mode: %s" % method
+    assert not out_of_core or threshold_free is None, "ERROR: Threshold-free approaches are not supported in out-of-core mode"
+
+# cluster the tree(s) in an input file (or stdin) and write the clusters to an output file (or stdout)
+def cluster_file(inpath, outpath, method, threshold, support=float('-inf'), threshold_free=None, out_of_core=False, tmp_dir=None):
+    check_job(method, threshold, support, threshold_free, out_of_core); method = method.lower()
+
+    # read the input (in out-of-core mode, its first tree) before opening the output, so a bad input doesn't empty an existing output file
+    if out_of_core:
+        from .out_of_core import OUT_OF_CORE,stream_trees
+        disk_trees = stream_trees(inpath, method, support, tmp_dir); tree = next(disk_trees, None)
+    else:
+        from treeswift import read_tree_newick
+        tmp = read_tree_newick(read_newick(inpath))
+        if isinstance(tmp, list):
+            trees = tmp
+        else:
+            trees = [tmp]
+
+    # out-of-core mode (the files of each tree are deleted even if opening the output or writing its clusters fails)
+    if out_of_core:
+        try:
+            outfile = open_output(outpath)
+            while tree is not None:
+                write_clusters(OUT_OF_CORE[method][4](tree,threshold), outfile)
+                tree.close(); tree = None
+                tree = next(disk_trees, None)
+        finally:
+            if tree is not None:
+                tree.close()
+            disk_trees.close()
+
+    # run algorithm
+    else:
+        outfile = open_output(outpath)
+        for t,tree in enumerate(trees):
+            if threshold_free is None:
+                clusters = METHODS[method](tree,threshold,support)
+            else:
+                clusters = THRESHOLDFREE[threshold_free](METHODS[method],tree,threshold,support)
+            write_clusters(clusters,outfile)
+    if outpath != 'stdout':
+        outfile.close()
+
+# read a batch manifest with one job per line: input, method, threshold, output, and optionally support (tab-separated, or whitespace-separated if there are no tabs; blank lines and lines starting with # are ignored)
+def read_manifest(path, support=float('-inf')):
+    jobs = list(); infile = open_input(path)
+    for num,line in enumerate(infile):
+        line = line.rstrip('\r\n')
+        if len(line.strip()) == 0 or line.lstrip().startswith('#'):
+            continue
+        parts = line.split('\t') if '\t' in line else line.split()
+        assert len(parts) in {4,5}, "ERROR: Invalid batch job on line %d (must be: input method threshold output [support]): %s" % (num+1,line)
+        try:
+            job = (parts[0], parts[3], parts[1], float(parts[2]), float(parts[4]) if len(parts) == 5 else support)
+        except ValueError:
+            assert False, "ERROR: Invalid threshold or support on line %d: %s" % (num+1,line)
+        jobs.append(job)
+    if path != 'stdin':
+        infile.close()
+    return jobs
@@ -0,0 +1,322 @@
+from .core import open_input
+
+# out-of-core statistics of a node from its children's statistics and (prepped) edge lengths, returned as (statistics, values stored on disk)
+def max_clade_summary(kids,edges):
+    leaf_dist = float('-inf'); second_max_leaf_dist = float('-inf')
+    for (kid_leaf_dist,kid_max_pair_dist),edge in zip(kids,edges):
+        curr_dist = kid_leaf_dist + edge
+        if curr_dist > leaf_dist:
+            second_max_leaf_dist = leaf_dist; leaf_dist = curr_dist
+        elif curr_dist > second_max_leaf_dist:
+            second_max_leaf_dist = curr_dist
+    max_pair_dist = max([k[1] for k in kids] + [leaf_dist + second_max_leaf_dist])
+    return (leaf_dist,max_pair_dist), (max_pair_dist,)
+def sum_bl_clade_summary(kids,edges):
+    total_bl = sum(k[0] + edge for k,edge in zip(kids,edges))
+    return (total_bl,), (total_bl,)
+def avg_clade_summary(kids,edges):
+    (x_num_leaves,x_total_pair_dist,x_total_leaf_dist),(y_num_leaves,y_total_pair_dist,y_total_leaf_dist) = kids; x_edge,y_edge = edges
+    num_leaves = x_num_leaves + y_num_leaves
+    total_leaf_dist_thru_x = x_total_leaf_dist + (x_num_leaves * x_edge)
+    total_leaf_dist_thru_y = y_total_leaf_dist + (y_num_leaves * y_edge)
+    total_pair_dist = (x_total_pair_dist + y_total_pair_dist) + (total_leaf_dist_thru_x*y_num_leaves + total_leaf_dist_thru_y*x_num_leaves)
+    total_leaf_dist = total_leaf_dist_thru_x + total_leaf_dist_thru_y
+    return (num_leaves,total_pair_dist,total_leaf_dist), (total_pair_dist/((num_leaves*(num_leaves-1))/2),)
+def length_clade_summary(kids,edges):
+    max_bl = max([k[0] for k in kids] + list(edges))
+    return (max_bl,), (max_bl,)
+def root_dist_summary(kids,edges):
+    return (), tuple(edges) # polytomies have been resolved, so these are the left and right edge lengths
+
+# a tree streamed to disk: per-node arrays (in postorder) of stored values, subtree sizes (in nodes) and numbers of leaves, and the leaf labels (in postorder, with the offset of each label and of the end of the last one)
+class DiskTree:
+    def __init__(self, path, num_values):
+        from os.path import join
+        self.path = path; self.maps = list(); self.views = list()
+        self.values = [self.disk_array('value%d' % i, 'd') for i in range(num_values)]
+        self.size = self.disk_array('size', 'q'); self.num_leaves = self.disk_array('num_leaves', 'q')
+        self.offsets = self.disk_array('offsets', 'q'); self.labels = open(join(path,'labels'),'rb')
+
+    # memory-map one of the tree's (non-empty) files as a read-only array
+    def disk_array(self, name, typecode):
+        from mmap import mmap,ACCESS_READ
+        from os.path import join
+        with open(join(self.path,name),'rb') as f:
+            m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        self.maps.append(m); self.views.append(memoryview(m).cast(typecode))
+        return self.views[-1]
+
+    # yield the labels of the leaves with the given indices (consecutive indices are read without seeking)
+    def leaf_labels(self, indices):
+        prev = None
+        for i in indices:
+            if prev is None or i != prev+1:
+                self.labels.seek(self.offsets[i])
+            yield self.labels.read(self.offsets[i+1]-self.offsets[i]).decode(); prev = i
+
+    # release the memory-mapped arrays and delete the tree's files
+    def close(self):
+        from shutil import rmtree
+        for v in reversed(self.views):
+            v.release()
+        for m in self.maps:
+            m.close()
+        self.labels.close(); rmtree(self.path)
+
+# write the nodes of a streamed tree to disk (in postorder) through small buffers
+class DiskTreeWriter:
+    def __init__(self, path, num_values, buffer_size=65536):
+        from array import array
+        from os.path import join
+        self.path = path; self.buffer_size = buffer_size; self.num_nodes = 0; self.num_bytes = 0
+        self.arrays = [(open(join(path,'value%d' % i),'wb'),array('d')) for i in range(num_values)]
+        self.arrays += [(open(join(path,name),'wb'),array('q')) for name in ('size','num_leaves','offsets')]
+        self.labels = open(join(path,'labels'),'wb')
+
+    def flush(self):
+        for f,a in self.arrays:
+            a.tofile(f); del a[:]
+
+    # add a node and return its index (its subtree is the "size" nodes ending at this index)
+    def add_node(self, values, size, num_leaves):
+        for (f,a),v in zip(self.arrays, values + (size,num_leaves)):
+            a.append(v)
+        if len(self.arrays[0][1]) >= self.buffer_size:
+            self.flush()
+        self.num_nodes += 1
+        return self.num_nodes-1
+
+    def add_leaf(self, label, values):
+        data = label.encode(); self.labels.write(data) # labels aren't delimited (they can contain any character)
+        self.arrays[-1][1].append(self.num_bytes); self.num_bytes += len(data)
+        return self.add_node(values, 1, 1)
+
+    # give the last leaf (which was added without a label) a label: nothing has been written after its label, so the label can simply be appended
+    def relabel_last_leaf(self, label):
+        data = label.encode(); self.labels.write(data); self.num_bytes += len(data)
+
+    def close(self):
+        self.arrays[-1][1].append(self.num_bytes); self.flush()
+        for f,a in self.arrays:
+            f.close()
+        self.labels.close()
+        return DiskTree(self.path, len(self.arrays)-3)
+
+    def discard(self):
+        from shutil import rmtree
+        for f,a in self.arrays:
+            f.close()
+        self.labels.close(); rmtree(self.path)
+
+# a stack of (first node, number of leaves, floats) records that keeps its top in memory and spills the rest to temporary files
+class DiskStack:
+    def __init__(self, num_floats, tmp_dir=None, buffer_size=65536):
+        from array import array
+        self.num_floats = num_floats; self.tmp_dir = tmp_dir; self.buffer_size = buffer_size
+        self.ints = array('q'); self.floats = array('d'); self.files = None; self.num_spilled = 0
+
+    def __len__(self):
+        return self.num_spilled + len(self.ints)//2
+
+    def push(self, first, num_leaves, floats):
+        if len(self.ints) == 4*self.buffer_size: # spill the bottom half of the buffer
+            self.spill()
+        self.ints.append(first); self.ints.append(num_leaves); self.floats.extend(floats)
+
+    def spill(self):
+        if self.files is None:
+            from tempfile import TemporaryFile
+            self.files = (TemporaryFile(dir=self.tmp_dir), TemporaryFile(dir=self.tmp_dir))
+        for f,a,width in zip(self.files, (self.ints,self.floats), (2,self.num_floats)):
+            n = self.buffer_size*width
+            f.seek(self.num_spilled*width*a.itemsize); a[:n].tofile(f); del a[:n]
+        self.num_spilled += self.buffer_size
+
+    def pop(self):
+        if len(self.ints) == 0: # read back the last spilled records
+            n = min(self.buffer_size, self.num_spilled); self.num_spilled -= n
+            for f,a,width in zip(self.files, (self.ints,self.floats), (2,self.num_floats)):
+                f.seek(self.num_spilled*width*a.itemsize); a.fromfile(f, n*width)
+        floats = tuple(self.floats[-self.num_floats:]); del self.floats[-self.num_floats:]
+        num_leaves = self.ints.pop(); first = self.ints.pop()
+        return first, num_leaves, floats
+
+    def close(self):
+        if self.files is not None:
+            for f in self.files:
+                f.close()
+
+# stream the tree(s) in a Newick file once, running prep() and the statistics pass of an out-of-core method in a single postorder pass that only keeps the partial statistics of the current path in memory, and yield each tree on disk
+def stream_trees(path, method, support, tmp_dir=None, chunk_size=1048576):
+    from re import compile
+    from tempfile import mkdtemp
+    resolve_polytomies, leaf_stats, leaf_values, summary, clusters = OUT_OF_CORE[method]
+    tokens = compile(r"[(),;:]|\[[^\]]*\]?|'[^']*'?|[^(),;:\[']+")
+
+    # a node summary is (index of first node in subtree, number of leaves, edge length, label, is leaf, statistics), where the label of a leaf is only '' (or None if it has none), since it's already on disk
+    def prepped_edge_length(edge_length, label, is_leaf):
+        edge_length = 0 if edge_length is None else edge_length
+        if not is_leaf:
+            try:
+                confidence = float('' if label is None else label)
+            except:
+                confidence = 100. # give edges without support values support 100
+            if confidence < support: # don't allow low-support edges
+                edge_length = float('inf')
+        return edge_length
+    resolved_edge_length = prepped_edge_length(0, None, False) # edge length of the nodes that resolve polytomies
+
+    # add a finished child to a node on the stack: the first child is kept as is (in case the node is a unifurcation), and the children of a polytomy are either pushed onto the pending stack (to be resolved when the node is finished) or folded into a running summary (max_clade, whose statistics don't depend on how a polytomy is resolved), so a wide polytomy doesn't fill the memory
+    def add_child(node, child):
+        node[0] += 1
+        if node[0] == 1:
+            node[3] = child; return
+        if node[0] == 2:
+            kids = [node[3], child]; node[3] = None
+        else:
+            kids = [child]
+        for first,num_leaves,edge_length,label,is_leaf,stats in kids:
+            edge_length = prepped_edge_length(edge_length, label, is_leaf)
+            if resolve_polytomies:
+                pending.push(first, num_leaves, (edge_length,) + tuple(stats))
+            elif node[4] is None:
+                node[4] = (first, num_leaves, edge_length, stats, None)
+            else:
+                r_first,r_num_leaves,r_edge_length,r_stats,values = node[4]
+                r_stats,values = summary([r_stats,stats], [r_edge_length,edge_length])
+                node[4] = (r_first, r_num_leaves+num_leaves, 0, r_stats, values)
+    def finish(node):
+        num_children,label,edge_length,child,running = node
+        if num_children == 0:
+            first = writer.add_leaf('' if label is None else label, leaf_values)
+            return (first, 1, edge_length, None if label is None else '', True, leaf_stats)
+        if num_children == 1: # suppress unifurcation
+            first,num_leaves,c_edge_length,c_label,is_leaf,stats = child
+            if edge_length is not None:
+                c_edge_length = (0 if c_edge_length is None else c_edge_length) + edge_length
+            if c_label is None and label is not None:
+                if is_leaf:
+                    writer.relabel_last_leaf(label); c_label = ''
+                else:
+                    c_label = label
+            return (first, num_leaves, c_edge_length, c_label, is_leaf, stats)
+        if resolve_polytomies: # same resolution as treeswift: the last two children are joined until two are left (so nodes stay in postorder)
+            first,num_leaves,floats = pending.pop(); c_edge_length = floats[0]; stats = floats[1:]
+            for i in range(num_children-1):
+                k_first,k_num_leaves,k_floats = pending.pop()
+                stats,values = summary([k_floats[1:],stats], [k_floats[0],c_edge_length])
+                first = k_first; num_leaves += k_num_leaves; c_edge_length = resolved_edge_length
+                writer.add_node(values, writer.num_nodes-first+1, num_leaves)
+        else:
+            first,num_leaves,c_edge_length,stats,values = running
+            writer.add_node(values, writer.num_nodes-first+1, num_leaves)
+        return (first, num_leaves, edge_length, label, False, stats)
+
+    # parse the Newick stream: each node on the stack is [number of finished children, label, edge length, first child, running summary]
+    infile = open_input(path); pending = DiskStack(1+len(leaf_stats), tmp_dir) if resolve_polytomies else None
+    writer = DiskTreeWriter(mkdtemp(prefix='treecluster_', dir=tmp_dir), len(leaf_values))
+    try:
+        stack = [[0,None,None,None,None]]; parse_length = False; in_label = False; after_comma = False
+        buf = ''; eof = False
+        while not eof:
+            chunk = infile.read(chunk_size); eof = len(chunk) == 0; buf += chunk; rest = ''
+            for m in tokens.finditer(buf):
+                if not eof and m.end() == len(buf): # token may continue in the next chunk
+                    rest = buf[m.start():]; break
+                t = m.group()
+                if t == '(':
+                    stack.append([0,None,None,None,None])
+                elif t == ',':
+                    node = stack.pop(); add_child(stack[-1], finish(node)); stack.append([0,None,None,None,None])
+                elif t == ')':
+                    node = stack.pop(); assert len(stack) != 0, "ERROR: Invalid Newick string"
+                    add_child(stack[-1], finish(node))
+                elif t == ';':
+                    assert len(stack) == 1, "ERROR: Invalid Newick string"
+                    finish(stack.pop()); tree = writer.close(); writer = None
+                    yield tree
+                    writer = DiskTreeWriter(mkdtemp(prefix='treecluster_', dir=tmp_dir), len(leaf_values))
+                    stack = [[0,None,None,None,None]]
+                elif t == ':':
+                    parse_length = True
+                elif t[0] == '[': # comment
+                    pass
+                else:
+                    if t[0] == "'":
+                        s = (t[1:-1] if len(t) > 1 and t[-1] == "'" else t[1:]).replace('\n','') # treeswift drops newlines in quoted labels too
+                    else:
+                        s = t.replace('\n','').replace('\r','')
+                        if after_comma:
+                            s = s.lstrip(' ') # skip spaces after commas
+                        if len(s.strip()) == 0:
+                            continue
+                    if parse_length:
+                        stack[-1][2] = float(s); parse_length = False; in_label = False
+                    else:
+                        stack[-1][1] = stack[-1][1] + s if in_label else s; in_label = True
+                    after_comma = False; continue
+                in_label = False; after_comma = t == ','
+            buf = rest
+        assert len(stack) == 1, "ERROR: Invalid Newick string"
+        if stack[0][0] != 0 or stack[0][1] is not None: # last tree is missing its semicolon
+            finish(stack.pop()); tree = writer.close(); writer = None
+            yield tree
+    finally: # delete the files of a tree that wasn't finished (e.g. invalid Newick)
+        if writer is not None:
+            writer.discard()
+        if pending is not None:
+            pending.close()
+        if path != 'stdin':
+            infile.close()
+
+# a cluster of a tree on disk, whose labels are only read when it is iterated
+class DiskCluster:
+    def __init__(self, tree, indices):
+        self.tree = tree; self.indices = indices
+    def __len__(self):
+        return len(self.indices)
+    def __iter__(self):
+        return self.tree.leaf_labels(self.indices)
+
+# out-of-core clade clustering: scan the nodes in reverse postorder (so ancestors come before descendants), and take the first clade found with a statistic at most threshold
+def disk_clade_clusters(tree, threshold):
+    stat = tree.values[0]; size = tree.size; num_leaves = tree.num_leaves
+    i = len(stat)-1; leaf_end = num_leaves[i]
+    while i >= 0:
+        if stat[i] <= threshold:
+            yield DiskCluster(tree, range(leaf_end-num_leaves[i], leaf_end))
+            leaf_end -= num_leaves[i]; i -= size[i]
+        else:
+            i -= 1
+
+# out-of-core root_dist: walk down from the root and cut every node further than threshold from the root (remaining leaves are spilled to disk and form a single cluster)
+def disk_root_dist_clusters(tree, threshold):
+    from array import array
+    from os.path import join
+    left_edge,right_edge = tree.values; size = tree.size; num_leaves = tree.num_leaves
+    root = len(size)-1; leaf_end = num_leaves[root]
+    remaining = open(join(tree.path,'remaining'),'wb'); buf = array('q'); num_remaining = 0
+    stack = array('q', [root]); dists = array('d', [0]) # all the children of a resolved polytomy can be on the stack
+    while len(stack) != 0:
+        i = stack.pop(); dist = dists.pop()
+        if dist > threshold:
+            yield DiskCluster(tree, range(leaf_end-num_leaves[i], leaf_end)); leaf_end -= num_leaves[i]
+        elif size[i] == 1:
+            leaf_end -= 1; buf.append(leaf_end); num_remaining += 1
+            if len(buf) >= 65536:
+                buf.tofile(remaining); del buf[:]
+        else: # visit the right child (which ends just before me) first, so leaves are reached in reverse postorder
+            r = i-1; l = r-size[r]
+            stack.append(l); dists.append(dist+left_edge[i]); stack.append(r); dists.append(dist+right_edge[i])
+    buf.tofile(remaining); remaining.close()
+    if num_remaining != 0:
+        tree.views.append(tree.disk_array('remaining', 'q')[::-1]) # back in postorder
+        yield DiskCluster(tree, tree.views[-1])
+
+OUT_OF_CORE = { # method: (resolve polytomies, statistics of a leaf, values stored on disk for a leaf, node statistics, cluster selection)
+    'max_clade': (False, (0,0), (0,), max_clade_summary, disk_clade_clusters),
+    'sum_branch_clade': (True, (0,), (0,), sum_bl_clade_summary, disk_clade_clusters),
+    'avg_clade': (True, (1,0,0), (0,), avg_clade_summary, disk_clade_clusters),
+    'length_clade': (True, (0,), (0,), length_clade_summary, disk_clade_clusters),
+    'root_dist': (True, (), (0,0), root_dist_summary, disk_root_dist_clusters)
+}
@@ -0,0 +1,135 @@
+from sys import stderr
+from . import core
+from .core import METHODS,avg_clade_stats,clade_clusters,length_clade_stats,max_clade_stats,med_clade_stats,prep,read_newick,sum_bl_clade_stats,write_clusters
+
+CLADE_METHODS = { # method: (statistics pass, node attribute holding the statistic, resolve polytomies in prep)
+    'max_clade': (max_clade_stats, 'max_pair_dist', False),
+    'sum_branch_clade': (sum_bl_clade_stats, 'total_bl', True),
+    'avg_clade': (avg_clade_stats, 'avg_pair_dist', True),
+    'med_clade': (med_clade_stats, 'med_pair_dist', True),
+    'length_clade': (length_clade_stats, 'max_bl', True)
+}
+
+# rough estimate of the memory (in bytes) held by the nodes of a tree and their attributes
+def tree_bytes(tree):
+    from sys import getsizeof
+    return sum(getsizeof(node) + getsizeof(node.__dict__) + sum(getsizeof(v) for v in node.__dict__.values()) for node in tree.traverse_preorder())
+
+# prepared trees kept in memory for the server, keyed by (tree name, method, support) for clade methods and by (tree name, None, None) for the other methods (which share one copy of each tree), with least-recently-used entries evicted once their total size exceeds max_bytes (tree files are re-read when a tree isn't cached, so only prepared trees take memory)
+class PreparedTreeCache:
+    def __init__(self, paths, max_bytes):
+        from collections import OrderedDict
+        from threading import Lock
+        self.paths = paths; self.max_bytes = max_bytes; self.num_bytes = 0
+        self.entries = OrderedDict(); self.building = dict(); self.lock = Lock()
+
+    # read and parse a fresh copy of a tree and run prep() and the statistics pass (clade methods) or save its edge lengths (other methods, which modify the tree)
+    def build(self, name, method, support):
+        from threading import Lock
+        from treeswift import read_tree_newick
+        tree = read_tree_newick(read_newick(self.paths[name]))
+        assert not isinstance(tree, list), "ERROR: Served tree must be a single tree: %s" % name
+        if method in CLADE_METHODS:
+            stats, key, resolve_polytomies = CLADE_METHODS[method]
+            prep(tree, support, resolve_polytomies=resolve_polytomies); stats(tree)
+            edge_lengths = None; num_bytes = tree_bytes(tree)
+        else:
+            tree.resolve_polytomies(); tree.suppress_unifurcations()
+            edge_lengths = [(node,node.edge_length) for node in tree.traverse_postorder()]
+            num_bytes = tree_bytes(tree) + 64*len(edge_lengths)
+        return {'tree':tree, 'edge_lengths':edge_lengths, 'lock':Lock(), 'bytes':num_bytes}
+
+    # return the prepared tree for a query, building it (once, even under concurrent queries) if it isn't cached
+    def get(self, name, method, support):
+        from threading import Lock
+        key = (name, method, support) if method in CLADE_METHODS else (name, None, None)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key); return self.entries[key]
+            build_lock = self.building.setdefault(key, Lock())
+        with build_lock:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key); return self.entries[key]
+            try:
+                entry = self.build(name, method, support)
+            finally:
+                with self.lock:
+                    self.building.pop(key, None)
+            with self.lock:
+                self.entries[key] = entry; self.num_bytes += entry['bytes']
+                while self.num_bytes > self.max_bytes and len(self.entries) > 1:
+                    self.num_bytes -= self.entries.popitem(last=False)[1]['bytes']
+        return entry
+
+    # cluster a served tree (clade methods only select clades from the cached statistics, so they can run concurrently)
+    def cluster(self, name, method, threshold, support):
+        entry = self.get(name, method, support)
+        if method in CLADE_METHODS:
+            return clade_clusters(entry['tree'], threshold, CLADE_METHODS[method][1])
+        with entry['lock']:
+            for node,l in entry['edge_lengths']:
+                node.edge_length = l
+            return METHODS[method](entry['tree'], threshold, support)
+
+# create (but don't start) an HTTP server that answers cluster queries: "GET /trees" lists the served trees, and "GET /cluster?tree=NAME&method=METHOD&threshold=T&support=S" returns the clusters (the cache of prepared trees is server.cache, and every tree is prepared for warm_method, if given)
+def make_server(paths, host, port, max_bytes, warm_method=None, warm_support=float('-inf')):
+    from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+    from io import StringIO
+    from urllib.parse import parse_qs,urlparse
+    cache = PreparedTreeCache(paths, max_bytes)
+    if warm_method is not None:
+        for name in paths:
+            cache.get(name, warm_method, warm_support)
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, code, text):
+            data = text.encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers(); self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path); params = {k:v[-1] for k,v in parse_qs(url.query).items()}
+            if url.path == '/trees':
+                self.respond(200, ''.join('%s\n' % name for name in sorted(paths))); return
+            if url.path != '/cluster':
+                self.respond(404, "ERROR: Invalid path: %s\n" % url.path); return
+            try:
+                name = params['tree']; method = params.get('method', 'max_clade').lower()
+                threshold = float(params['threshold']); support = float(params.get('support', '-inf'))
+            except KeyError as e:
+                self.respond(400, "ERROR: Missing parameter: %s\n" % e.args[0]); return
+            except ValueError as e:
+                self.respond(400, "ERROR: %s\n" % e); return
+            if name not in paths:
+                self.respond(404, "ERROR: Invalid tree: %s\n" % name); return
+            if method not in METHODS:
+                self.respond(400, "ERROR: Invalid method: %s\n" % method); return
+            if not threshold >= 0: # also rejects NaN
+                self.respond(400, "ERROR: Length threshold must be at least 0\n"); return
+            if not (support >= 0 or support == float('-inf')): # also rejects NaN
+                self.respond(400, "ERROR: Branch support must be at least 0\n"); return
+            try:
+                out = StringIO(); write_clusters(cache.cluster(name, method, threshold, support), out)
+            except Exception as e:
+                self.respond(500, "ERROR: %s: %s\n" % (type(e).__name__, e)); return
+            self.respond(200, out.getvalue())
+
+        def log_message(self, format, *args):
+            if core.VERBOSE:
+                BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    server = ThreadingHTTPServer((host,port), Handler); server.cache = cache
+    return server
+
+# run the server until it's interrupted
+def serve(paths, host, port, max_bytes, warm_method, warm_support):
+    server = make_server(paths, host, port, max_bytes, warm_method, warm_support)
+    print("Serving %d tree(s) on http://%s:%d" % (len(paths),host,server.server_port), file=stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()